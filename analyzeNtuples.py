@@ -5,13 +5,18 @@ import yaml
 import importlib
 import pathlib
 
+try:
+    # libyaml C parser: same semantics as FullLoader (the cfg files use !!python/name tags)
+    from yaml import CFullLoader as FullLoader
+except ImportError:
+    from yaml import FullLoader
+
 from rich import print as pprint
 
 from python.analyzer import analyze
-from python.parameters import Parameters, get_collection_parameters
+from python.parameters import Options, get_collection_parameters
 from python.submission import to_HTCondor
 from python.timecounter import print_stats
-import ROOT
 
 description = """
 Main script for L1 TP analysis.
@@ -54,6 +59,7 @@ def analyzeNtuples(  # noqa: PLR0913
     local: bool = typer.Option(False, '-l', '--local', help='run the batch on local resources'),
     workers: int = typer.Option(2, '-j', '--jobworkers', help='# of local workers'),
     workdir: str = typer.Option(None, '-w', '--workdir', help='local work directory'),
+    fileworkers: int = typer.Option(1, '-J', '--file-workers', help='# of processes reading the input files in parallel'),
     submit: bool = typer.Option(False, '-S', '--submit', help='submit the jobs via CONDOR'),
 ):
     if submit and local and not workdir:
@@ -61,7 +67,7 @@ def analyzeNtuples(  # noqa: PLR0913
 
     def parse_yaml(filename):
         with open(filename) as stream:
-            return yaml.load(stream, Loader=yaml.FullLoader)
+            return yaml.load(stream, Loader=FullLoader)
 
     cfgfile = {}
 
@@ -73,20 +79,20 @@ def analyzeNtuples(  # noqa: PLR0913
     cfgfile.update(parse_yaml(configfile))
     cfgfile.update(parse_yaml(datasetfile))
 
-    opt = Parameters(
-        {
-            'COLLECTION': collection,
-            'SAMPLE': sample,
-            'DEBUG': debug,
-            'NEVENTS': nevents,
-            'BATCH': batch,
-            'RUN': run,
-            'OUTDIR': outdir,
-            'LOCAL': local,
-            'WORKERS': workers,
-            'WORKDIR': workdir,
-            'SUBMIT': submit,
-        }
+    opt = Options(
+        COLLECTION=collection,
+        SAMPLE=sample,
+        DEBUG=debug,
+        NEVENTS=nevents,
+        BATCH=batch,
+        RUN=run,
+        OUTDIR=outdir,
+        LOCAL=local,
+        WORKERS=workers,
+        WORKDIR=workdir,
+        SUBMIT=submit,
+        CONFIGFILE=configfile,
+        DATASETFILE=datasetfile,
     )
     collection_params = get_collection_parameters(opt, cfgfile)
 
@@ -129,7 +135,7 @@ def analyzeNtuples(  # noqa: PLR0913
         pprint(
             f'\n\n========================== #{idx+1}/{len(samples_to_process)}: {sample.name} ==========================\n'
         )
-        ret_nevents += analyze(sample, batch_idx=batch_idx)
+        ret_nevents += analyze(sample, batch_idx=batch_idx, n_workers=fileworkers)
     return ret_nevents
 
 
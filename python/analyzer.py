@@ -1,7 +1,11 @@
+import multiprocessing
 import os
 import sys
+import time
 import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+import numba
 import uproot as up
 from rich import print as pprint
 
@@ -14,8 +18,80 @@ from python import collections, timecounter
 # @profile
 analyze_counter = 1
 
+# job configuration of the worker processes (set by init_worker)
+_worker_job = {}
 
-def analyze(params, batch_idx=-1):
+
+def process_file(tree_file_name, tree_reader, params, deadline=None):
+    # returns False when the event loop was stopped because the batch slot is about to end
+    debug = int(params.debug)
+    collection_manager = collections.EventManager()
+    batch_size = collection_manager.batch_size()
+
+    tree_file = fm.open_file(tree_file_name)
+    pprint(f'opening file: {tree_file_name}')
+    pprint(f' . tree name: {params.tree_name}')
+
+    ttree = tree_file[params.tree_name]
+
+    tree_reader.setTree(ttree)
+
+    while tree_reader.next_batch(batch_size, debug):
+        try:
+            collection_manager.read_batch(tree_reader, debug)
+
+            for plotter in params.plotters:
+                if plotter.fill_per_event:
+                    for file_entry in range(tree_reader.file_entry, tree_reader.file_entry + tree_reader.batch_entries):
+                        plotter.fill_histos_event(file_entry, debug=debug)
+                else:
+                    plotter.fill_histos_batch(debug=debug)
+
+        except Exception as inst:
+            tree_reader.printEntry()
+            pprint(f'[EXCEPTION OCCURRED:] {inst!s}')
+            pprint('Unexpected error:', sys.exc_info()[0])
+            traceback.print_exc()
+            tree_reader.close()
+            tree_file.close()
+            sys.exit(200)
+
+        # checked once per batch, outside of the try: a problem here is not an event processing error
+        if deadline is not None and time.monotonic() > deadline:
+            tree_reader.printEntry()
+            pprint('    less than 5 min left for batch slot: exit event loop!')
+            timecounter.counter.job_flavor_time_perc(params.htc_jobflavor)
+            tree_reader.close()
+            tree_file.close()
+            return False
+
+    tree_reader.close()
+    tree_file.close()
+    return True
+
+
+def init_worker(params, deadline, n_threads):
+    # the pool is forked: the arguments are inherited and not pickled
+    _worker_job.update(params=params, deadline=deadline, n_threads=n_threads)
+    # the numba kernels (parallel=True) get the same share of the cores as the uproot reading threads
+    numba.set_num_threads(n_threads)
+
+
+def process_file_worker(tree_file_name, entry_range):
+    # runs in a forked process: plotters, collections and booked histos are a copy of the parent ones.
+    # The processes are reused for several files: the histos are zeroed so that only this file is returned
+    deadline = _worker_job['deadline']
+    if deadline is not None and time.monotonic() > deadline:
+        # the batch slot is about to end: the file is not even opened
+        return 0, None, False
+    hm = Histos.HistoManager()
+    hm.resetHistos()
+    tree_reader = treereader.TreeReader(entry_range, -1, _worker_job['n_threads'])
+    completed = process_file(tree_file_name, tree_reader, _worker_job['params'], deadline)
+    return tree_reader.n_tot_entries, hm.histoList, completed
+
+
+def analyze(params, batch_idx=-1, n_workers=1):
     params.print()
     debug = int(params.debug)
 
@@ -53,73 +129,83 @@ def analyze(params, batch_idx=-1):
     if params.rate_pt_wps:
         calib_manager.set_pt_wps_version(params.rate_pt_wps)
 
-    output = up.recreate(params.output_filename)
-    hm = Histos.HistoManager()
-    hm.file = output
-
-    # instantiate all the plotters
-    plotter_collection = []
-    plotter_collection.extend(params.plotters)
-
-    # -------------------------BOOK HISTOS------------------------------
-
-    for plotter in plotter_collection:
-        plotter.print()
-        plotter.book_histos()
-
-    collection_manager = collections.EventManager()
-
-    if params.weight_file is not None:
-        collection_manager.read_weight_file(params.weight_file)
-
-    # -------------------------EVENT LOOP--------------------------------
-
-    tree_reader = treereader.TreeReader(range_ev, params.maxEvents)
-    pprint('')
-    pprint(f"{'events_per_job':<15}: {params.events_per_job}")
-    pprint(f"{'maxEvents':<15}: {params.maxEvents}")
-    pprint(f"{'range_ev':<15}: {range_ev}")
-    pprint('')
-
-    for tree_file_name in files_with_protocol:
-        tree_file = up.open(tree_file_name, num_workers=1)
-        pprint(f'opening file: {tree_file_name}')
-        pprint(f' . tree name: {params.tree_name}')
-
-        ttree = tree_file[params.tree_name]
-
-        tree_reader.setTree(ttree)
-
-        while tree_reader.next(debug):
-            try:
-                collection_manager.read(tree_reader, debug)
-
-                for plotter in plotter_collection:
-                    plotter.fill_histos_event(tree_reader.file_entry, debug=debug)
-
-                if (
-                    batch_idx != -1
-                    and timecounter.counter.started()
-                    and tree_reader.global_entry % 100 == 0
-                    and timecounter.counter.job_flavor_time_left(params.htc_jobflavor) < 5 * 60
-                ):
-                    tree_reader.printEntry()
-                    pprint('    less than 5 min left for batch slot: exit event loop!')
-                    timecounter.counter.job_flavor_time_perc(params.htc_jobflavor)
+    # the histograms are written at the end of the job, the tuples while filling
+    with up.recreate(params.output_filename) as output:
+        hm = Histos.HistoManager()
+        hm.file = output
+
+        # instantiate all the plotters
+        plotter_collection = []
+        plotter_collection.extend(params.plotters)
+
+        # -------------------------BOOK HISTOS------------------------------
+
+        for plotter in plotter_collection:
+            plotter.print()
+            plotter.book_histos()
+
+        collection_manager = collections.EventManager()
+
+        if params.weight_file is not None:
+            collection_manager.read_weight_file(params.weight_file)
+
+        # -------------------------EVENT LOOP--------------------------------
+
+        tree_reader = treereader.TreeReader(range_ev, params.maxEvents)
+        # the events are processed in batches of the size read by the collections in one go
+        batch_size = collection_manager.batch_size()
+        pprint('')
+        pprint(f"{'events_per_job':<15}: {params.events_per_job}")
+        pprint(f"{'maxEvents':<15}: {params.maxEvents}")
+        pprint(f"{'range_ev':<15}: {range_ev}")
+        pprint(f"{'batch_size':<15}: {batch_size}")
+        pprint('')
+
+        if n_workers > 1 and any(isinstance(histo, Histos.BaseUpTuples) for histo in hm.histoList):
+            pprint('WARNING: tuples are written to the output file while filling, the files will be processed sequentially')
+            n_workers = 1
+
+        # batch jobs stop the event loop when less than 5 min are left in the slot
+        deadline = None
+        if batch_idx != -1 and timecounter.counter.started():
+            deadline = timecounter.counter.job_flavor_deadline(params.htc_jobflavor, margin=5 * 60)
+
+        n_tot_entries = 0
+        if n_workers > 1:
+            # the threads of each process share the cores: no more threads than cores overall
+            n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+            file_ranges = fm.get_entry_ranges_per_file(
+                files=files_with_protocol,
+                tree=params.tree_name,
+                entry_range=range_ev,
+                max_events=params.maxEvents,
+            )
+            pprint(f'processing {len(file_ranges)} files on {n_workers} processes')
+            # fork explicitly: the configuration (plotters, selections) is not picklable
+            with ProcessPoolExecutor(max_workers=n_workers,
+                                     mp_context=multiprocessing.get_context('fork'),
+                                     initializer=init_worker,
+                                     initargs=(params, deadline, n_threads)) as executor:
+                futures = [executor.submit(process_file_worker, tree_file_name, entry_range)
+                           for tree_file_name, entry_range in file_ranges.items()]
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+                    n_entries, histos, completed = future.result()
+                    n_tot_entries += n_entries
+                    if histos is not None:
+                        hm.mergeHistos(histos)
+                    if not completed:
+                        # out of time: the files not started yet are dropped
+                        for pending in futures:
+                            pending.cancel()
+        else:
+            for tree_file_name in files_with_protocol:
+                if not process_file(tree_file_name, tree_reader, params, deadline):
                     break
+            n_tot_entries = tree_reader.n_tot_entries
 
-            except Exception as inst:
-                tree_reader.printEntry()
-                pprint(f'[EXCEPTION OCCURRED:] {inst!s}')
-                pprint('Unexpected error:', sys.exc_info()[0])
-                traceback.print_exc()
-                tree_file.close()
-                sys.exit(200)
-
-        tree_file.close()
-
-    pprint(f'Writing histos to file {params.output_filename}')
-    hm.writeHistos()
-    output.close()
+        pprint(f'Writing histos to file {params.output_filename}')
+        hm.writeHistos()
 
-    return tree_reader.n_tot_entries
+    return n_tot_entries
@@ -1,6 +1,12 @@
 import awkward as ak
 import hist
+import numpy as np
+import uproot as up
 from hist import Hist
+from uproot.writing.identify import to_TAxis, to_TProfile, to_TProfile2D
+
+# error options of the ROOT profiles: error on the mean ('') or spread ('s', 'i', 'g')
+PROFILE_ERROR_MODES = {'': 0, 's': 1, 'i': 2, 'g': 3}
 
 
 def TH1F(name, title, nbins, bin_low, bin_high):
@@ -36,6 +42,42 @@ def TH2F(name, title, x_nbins, x_bin_low, x_bin_high, y_nbins, y_bin_low, y_bin_
         )
 
 
+def TProfile(name, title, nbins, bin_low, bin_high, option=''):
+    b_axis_name = 'X'
+    title_split = title.split(';')
+    if len(title_split) > 1:
+        b_axis_name = title_split[1]
+    b_name = title_split[0]
+    b_label = name
+    return Hist(
+        hist.axis.Regular(bins=nbins, start=bin_low, stop=bin_high, name=b_axis_name),
+        label=b_label,
+        name=b_name,
+        storage=hist.storage.Mean(),
+        metadata={'error_mode': PROFILE_ERROR_MODES[option]}
+        )
+
+
+def TProfile2D(name, title, x_nbins, x_bin_low, x_bin_high, y_nbins, y_bin_low, y_bin_high, option=''):
+    b_x_axis_name = 'X'
+    b_y_axis_name = 'Y'
+    title_split = title.split(';')
+    if len(title_split) > 1:
+        b_x_axis_name = title_split[1]
+    if len(title_split) > 2:
+        b_y_axis_name = title_split[2]
+    b_name = title_split[0]
+    b_label = name
+    return Hist(
+        hist.axis.Regular(bins=x_nbins, start=x_bin_low, stop=x_bin_high, name=b_x_axis_name),
+        hist.axis.Regular(bins=y_nbins, start=y_bin_low, stop=y_bin_high, name=b_y_axis_name),
+        label=b_label,
+        name=b_name,
+        storage=hist.storage.Mean(),
+        metadata={'error_mode': PROFILE_ERROR_MODES[option]}
+        )
+
+
 def TH2F_category(name, title, x_categories, y_nbins, y_bin_low, y_bin_high):
     b_x_axis_name = 'X'
     b_y_axis_name = 'Y'
@@ -55,23 +97,87 @@ def TH2F_category(name, title, x_categories, y_nbins, y_bin_low, y_bin_high):
         )
 
 
+def flat_array(array):
+    # contiguous numpy array of the (not None) values: hist fills it in a single call without further copies
+    return np.ascontiguousarray(ak.to_numpy(ak.drop_none(ak.flatten(array))))
+
+
 def fill_1Dhist(hist, array, weights=None):
-    flar = ak.drop_none(ak.flatten(array))
+    flar = flat_array(array)
+    if len(flar) == 0:
+        return
     if weights is None:
         hist.fill(flar, threads=None)
         # ROOT.fill_1Dhist(hist=hist, array=flar)
     else:
-        hist.fill(flar, weights)
+        hist.fill(flar, weight=flat_array(weights))
         # ROOT.fill_1Dhist(hist=hist, array=flar, weights=weights)
 
 def fill_2Dhist(hist, arrayX, arrayY, weights=None):
-    flar_x = ak.drop_none(ak.flatten(arrayX))
-    flar_y = ak.drop_none(ak.flatten(arrayY))
+    flar_x = flat_array(arrayX)
+    flar_y = flat_array(arrayY)
+    if len(flar_x) == 0:
+        return
 
     if weights is None:
         # ROOT.fill_2Dhist(hist=hist, arrayX=flar_x, arrayY=flar_y)
         hist.fill(flar_x, flar_y, threads=None)
     else:
         # ROOT.fill_2Dhist(hist=hist, arrayX=flar_x, arrayY=flar_y, weights=weights)
-        hist.fill(flar_x, flar_y, weights)
+        hist.fill(flar_x, flar_y, weight=flat_array(weights))
+
 
+def to_writable(histo):
+    # uproot (5.0) does not write the Mean storage: the profiles are converted to TProfile and TProfile2D by hand
+    if histo.kind != 'MEAN':
+        return up.to_writable(histo)
+
+    view = histo.view(flow=True)
+    # ROOT keeps sum(y) and sum(y^2) per bin, the Mean storage the count, the mean and the sum of the squared deltas
+    counts = view.count
+    sum_y = counts * view.value
+    sum_y2 = view._sum_of_deltas_squared + sum_y * view.value
+    in_range = (slice(1, -1),) * histo.ndim
+    entries = counts[in_range]
+
+    def root_cells(array):
+        # ROOT stores the cells with x running fastest
+        return np.ascontiguousarray(array.T.reshape(-1), dtype=np.float64)
+
+    axes = [to_TAxis(fName=f'{axis_name}axis', fTitle=axis.label, fNbins=len(axis), fXmin=axis.edges[0], fXmax=axis.edges[-1])
+            for axis, axis_name in zip(histo.axes, 'xy')]
+    profile = {
+        'fName': None,
+        'fTitle': histo.name,
+        'data': root_cells(sum_y),
+        'fEntries': counts.sum(),
+        'fTsumw': entries.sum(),
+        'fTsumw2': entries.sum(),
+        'fSumw2': root_cells(sum_y2),
+        'fBinEntries': root_cells(counts),
+        'fBinSumw2': root_cells(counts),
+        'fErrorMode': histo.metadata['error_mode'],
+    }
+    if histo.ndim == 1:
+        x = histo.axes[0].centers
+        return to_TProfile(
+            **profile,
+            fTsumwx=(entries*x).sum(),
+            fTsumwx2=(entries*x**2).sum(),
+            fTsumwy=sum_y[in_range].sum(),
+            fTsumwy2=sum_y2[in_range].sum(),
+            fXaxis=axes[0],
+        )
+    x, y = histo.axes.centers
+    return to_TProfile2D(
+        **profile,
+        fTsumwx=(entries*x).sum(),
+        fTsumwx2=(entries*x**2).sum(),
+        fTsumwy=(entries*y).sum(),
+        fTsumwy2=(entries*y**2).sum(),
+        fTsumwxy=(entries*x*y).sum(),
+        fTsumwz=sum_y[in_range].sum(),
+        fTsumwz2=sum_y2[in_range].sum(),
+        fXaxis=axes[0],
+        fYaxis=axes[1],
+    )
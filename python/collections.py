@@ -27,7 +27,6 @@ import python.calibrations as calib
 import python.clusterTools as clAlgo
 from python import classifiers, pf_regions, selections
 
-# import root_numpy.tmva as rnptmva
 from .utils import debugPrintOut
 
 
@@ -78,6 +77,16 @@ class EventManager:
                     print(f'[EventManager] filling collection: {collection.name}')
                 collection.fill(event, self.weight_file, debug)
 
+        def read_batch(self, event, debug):
+            for collection in self.active_collections:
+                if debug >= 3:
+                    print(f'[EventManager] filling collection: {collection.name} (batch)')
+                collection.fill_batch(event, self.weight_file, debug)
+
+        def batch_size(self):
+            # the batch can't be larger than what any of the active collections is configured to read
+            return min([coll.read_entry_block for coll in self.active_collections], default=10000)
+
         def get_labels(self):
             label_dict = {}
             for col in self.collections:
@@ -202,6 +211,20 @@ class DFCollection:
                           toPrint=self.print_function(df_print),
                           max_lines=self.max_print_lines)
 
+    def fill_batch(self, event, weight_file=None, debug=0):
+        # the whole batch [file_entry, file_entry+batch_entries) is read in one go
+        self.new_read = True
+        self.next_entry_read = event.file_entry + event.batch_entries
+        self.new_read_nentries = event.batch_entries
+        self.fill_real(event, event.batch_entries, weight_file, debug)
+
+        if self.debug > 0:
+            df_print = ak.to_dataframe(self.df)
+            debugPrintOut(max(debug, self.debug), self.label,
+                          toCount=df_print,
+                          toPrint=self.print_function(df_print),
+                          max_lines=self.max_print_lines)
+
     def fill_real(self, event, stride, weight_file=None, debug=0):
         self.df = self.filler_function(event, stride)
         if self.fixture_function is not None:
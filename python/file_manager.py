@@ -251,13 +251,14 @@ def get_checksum(filename):
 #     xrdadler32 plots1/histos_ele_flat2to100_PU200_v55_93.root
 
 
+EOS_PROTOCOLS = {
+    '/eos/user/': 'root://eosuser.cern.ch/',
+    '/eos/cms/': 'root://eoscms.cern.ch/',
+}
+
+
 def get_eos_protocol(dirname):
-    protocol = ''
-    if '/eos/user/' in dirname:
-        protocol = 'root://eosuser.cern.ch/'
-    elif '/eos/cms/' in dirname:
-        protocol = 'root://eoscms.cern.ch/'
-    return protocol
+    return next((protocol for prefix, protocol in EOS_PROTOCOLS.items() if prefix in dirname), '')
 
 
 def file_name_wprotocol(filename):
@@ -265,6 +266,17 @@ def file_name_wprotocol(filename):
     return f'{protocol}{filename}'
 
 
+# options for opening the ntuples with uproot:
+# a larger first chunk gets the file header and the TTree metadata in one round-trip instead of several
+UPROOT_OPEN_OPTIONS = {
+    'begin_chunk_size': 512 * 1024,
+}
+
+
+def open_file(file_name, num_workers=1):
+    return up.open(file_name, num_workers=num_workers, **UPROOT_OPEN_OPTIONS)
+
+
 def copy_from_eos(input_dir, file_name, target_file_name, dowait=False, silent=False):
     fs = XrdFileSystem(get_eos_protocol(input_dir))
     return fs.copy(os.path.join(input_dir, file_name), target_file_name, silent)
@@ -318,6 +330,29 @@ def get_number_of_jobs_for_batchprocessing(input_dir, tree, nev_toprocess, nev_p
     return len(get_njobs(nev_toprocess, nev_perjob, metadata, debug).keys())
 
 
+def get_entry_ranges_per_file(files, tree, entry_range, max_events):
+    # split the (first file based) entry range of the job in one range per file
+    ret = {}
+    first_entry = 0
+    nev_toprocess = max_events
+    for idx, file_name in enumerate(files):
+        tree_file = open_file(file_name)
+        nevents = tree_file[tree].num_entries
+        tree_file.close()
+
+        start = entry_range[0] if idx == 0 else 0
+        stop = nevents
+        if entry_range[1] != -1:
+            stop = min(stop, entry_range[1] + 1 - first_entry)
+        if nev_toprocess != -1:
+            stop = min(stop, start + nev_toprocess)
+            nev_toprocess -= max(stop - start, 0)
+        if stop > start:
+            ret[file_name] = (start, stop - 1)
+        first_entry += nevents
+    return ret
+
+
 def get_metadata(input_dir, tree, debug=0):
     json_name = 'metadata.json'
     file_metadata = {}
@@ -331,7 +366,7 @@ def get_metadata(input_dir, tree, debug=0):
         for idx, file_name in enumerate(files):
             nevents = 0
             try:
-                tree_file = up.open(file_name_wprotocol(file_name))
+                tree_file = open_file(file_name_wprotocol(file_name))
                 nevents = tree_file[tree].num_entries
                 tree_file.close()
             except OSError as error:
@@ -2,8 +2,6 @@ from array import array
 
 import awkward as ak
 import hist
-
-# import root_numpy as rnp
 import numpy as np
 import ROOT
 
@@ -31,9 +29,21 @@ class HistoManager:
             # print 'ADD histo: {}'.format(histo)
             self.histoList.append(histo)
 
+        def mergeHistos(self, histos):
+            # histos: the histoList of another process booked with the same plotters
+            for histo, other in zip(self.histoList, histos, strict=True):
+                histo.add(other)
+
+        def resetHistos(self):
+            for histo in self.histoList:
+                histo.reset()
+
         def writeHistos(self):
+            # all the histos are handed to uproot in one go so that each directory is written only once
+            writable_histos = {}
             for histo in self.histoList:
-                histo.write(self.file)
+                writable_histos.update(histo.writable_histos())
+            self.file.update(writable_histos)
 
     instance = None
 
@@ -79,21 +89,44 @@ class BaseHistos:
             hm = HistoManager()
             hm.addHistos(self)
 
-    def write(self, upfile):
+    def writable_histos(self):
         dir_name = self.__class__.__name__
+        ret = {}
         for histo in [a for a in dir(self) if a.startswith('h_')]:
             writeable_hist = getattr(self, histo)
             # print (f"Writing {histo} class {writeable_hist.__class__.__name__}")
             if 'GraphBuilder' in writeable_hist.__class__.__name__ :
                 continue
-            elif 'TH1' in writeable_hist.__class__.__name__ or 'TH2' in writeable_hist.__class__.__name__:
-                # print('start')
+            elif isinstance(writeable_hist, ROOT.TH1):
                 # FIXME: this somehow fails randomply. ROOT not lining the right python???
-                upfile[f'{dir_name}/{writeable_hist.GetName()}'] = writeable_hist
-                # print('ok')
+                ret[f'{dir_name}/{writeable_hist.GetName()}'] = writeable_hist
             else:
-                up_writeable_hist = up.to_writable(writeable_hist)
-                upfile[f'{dir_name}/{writeable_hist.label}'] = up_writeable_hist
+                ret[f'{dir_name}/{writeable_hist.label}'] = bh.to_writable(writeable_hist)
+        return ret
+
+    def write(self, upfile):
+        upfile.update(self.writable_histos())
+
+    def add(self, other):
+        for histo in [a for a in dir(self) if a.startswith('h_')]:
+            this_hist = getattr(self, histo)
+            if 'GraphBuilder' in this_hist.__class__.__name__:
+                continue
+            elif isinstance(this_hist, ROOT.TH1):
+                # TH2 and TProfile included
+                this_hist.Add(getattr(other, histo))
+            else:
+                setattr(self, histo, this_hist + getattr(other, histo))
+
+    def reset(self):
+        for histo in [a for a in dir(self) if a.startswith('h_')]:
+            this_hist = getattr(self, histo)
+            if 'GraphBuilder' in this_hist.__class__.__name__:
+                continue
+            elif isinstance(this_hist, ROOT.TH1):
+                this_hist.Reset()
+            else:
+                this_hist.reset()
 
     # def normalize(self, norm):
     #     className = self.__class__.__name__
@@ -204,6 +237,10 @@ class BaseUpTuples(BaseHistos):
             hm.file[f'{dir_name}/{self.t_name}'] = data
             self.init_ = True
 
+    def writable_histos(self):
+        # the tuples are written to file while filling
+        return {}
+
     def write(self, upfile):
         return
 
@@ -441,7 +478,7 @@ class TCHistos(BaseHistos):
             self.h_subdet = bh.TH1F(f'{name}_subdet', 'TC subdet #', 8, 0, 8)
             self.h_mipPt = bh.TH1F(f'{name}_mipPt', 'TC MIP Pt', 50, 0, 10)
 
-            self.h_layer = ROOT.TProfile(f'{name}_layer', 'TC layer #', 60, 0, 60, 's')
+            self.h_layer = bh.TProfile(f'{name}_layer', 'TC layer #', 60, 0, 60, 's')
             self.h_absz = bh.TH1F(f'{name}_absz', 'TC z(cm)', 100, 300, 500)
             self.h_wafertype = bh.TH1F(f'{name}_wafertype', 'Wafer type', 10, 0, 10)
             self.h_layerVenergy = bh.TH2F(f'{name}_layerVenergy', 'Energy (GeV) vs Layer #', 60, 0, 60, 100, 0, 2)
@@ -450,29 +487,31 @@ class TCHistos(BaseHistos):
             # self.h_energyVetaL6t10 = bh.TH2F(name+'_energyVetaL6t10', "Energy (GeV) vs Eta (layers 6 to 10)", 100, -3.5, 3.5, 100, 0, 2)
             # self.h_energyVetaL11t20 = bh.TH2F(name+'_energyVetaL11t20', "Energy (GeV) vs Eta (layers 11 to 20)", 100, -3.5, 3.5, 100, 0, 2)
             # self.h_energyVetaL21t60 = bh.TH2F(name+'_energyVetaL21t60', "Energy (GeV) vs Eta (layers 21 to 60)", 100, -3.5, 3.5, 100, 0, 2)
-            self.h_energyPetaVphi = ROOT.TProfile2D(f'{name}_energyPetaVphi', 'Energy profile (GeV) vs Eta and Phi', 100, -3.5, 3.5, 100, -3.2, 3.2)
+            self.h_energyPetaVphi = bh.TProfile2D(f'{name}_energyPetaVphi', 'Energy profile (GeV) vs Eta and Phi', 100, -3.5, 3.5, 100, -3.2, 3.2)
 
         BaseHistos.__init__(self, name, root_file, debug)
 
     def fill(self, tcs):
-        rnp.fill_hist(self.h_energy, tcs.energy)
-        rnp.fill_hist(self.h_subdet, tcs.subdet)
-        rnp.fill_hist(self.h_mipPt, tcs.mipPt)
-        cnt = tcs.layer.value_counts().to_frame(name='counts')
-        cnt['layer'] = cnt.index.values
-        rnp.fill_profile(self.h_layer, cnt[['layer', 'counts']])
-        rnp.fill_hist(self.h_absz, np.fabs(tcs.z))
-        rnp.fill_hist(self.h_wafertype, tcs.wafertype)
-        rnp.fill_hist(self.h_wafertype, tcs.wafertype)
+        bh.fill_1Dhist(self.h_energy, tcs.energy)
+        bh.fill_1Dhist(self.h_subdet, tcs.subdet)
+        bh.fill_1Dhist(self.h_mipPt, tcs.mipPt)
+        # TC multiplicity per layer in each event
+        layers = ak.sort(tcs.layer, axis=1)
+        layer_counts = ak.run_lengths(layers)
+        layer_values = ak.firsts(ak.unflatten(layers, ak.flatten(layer_counts), axis=1), axis=2)
+        self.h_layer.fill(bh.flat_array(layer_values), sample=bh.flat_array(layer_counts))
+        bh.fill_1Dhist(self.h_absz, np.fabs(tcs.z))
+        bh.fill_1Dhist(self.h_wafertype, tcs.wafertype)
+        bh.fill_1Dhist(self.h_wafertype, tcs.wafertype)
         # FIXME: should bin this guy in eta bins
-        rnp.fill_hist(self.h_layerVenergy, tcs[['layer', 'energy']])
-        rnp.fill_hist(self.h_energyVeta, tcs[['eta', 'energy']])
-        rnp.fill_hist(self.h_energyVeta, tcs[['eta', 'energy']])
+        bh.fill_2Dhist(self.h_layerVenergy, tcs.layer, tcs.energy)
+        bh.fill_2Dhist(self.h_energyVeta, tcs.eta, tcs.energy)
+        bh.fill_2Dhist(self.h_energyVeta, tcs.eta, tcs.energy)
         # rnp.fill_hist(self.h_energyVetaL1t5, tcs[(tcs.layer >= 1) & (tcs.layer <= 5)][['eta', 'energy']])
         # rnp.fill_hist(self.h_energyVetaL6t10, tcs[(tcs.layer >= 6) & (tcs.layer <= 10)][['eta', 'energy']])
         # rnp.fill_hist(self.h_energyVetaL11t20, tcs[(tcs.layer >= 11) & (tcs.layer <= 20)][['eta', 'energy']])
         # rnp.fill_hist(self.h_energyVetaL21t60, tcs[(tcs.layer >= 21) & (tcs.layer <= 60)][['eta', 'energy']])
-        rnp.fill_profile(self.h_energyPetaVphi, tcs[['eta', 'phi', 'energy']])
+        self.h_energyPetaVphi.fill(bh.flat_array(tcs.eta), bh.flat_array(tcs.phi), sample=bh.flat_array(tcs.energy))
 
 
 class ClusterHistos(BaseHistos):
@@ -490,15 +529,15 @@ class ClusterHistos(BaseHistos):
         BaseHistos.__init__(self, name, root_file, debug)
 
     def fill(self, clsts):
-        rnp.fill_hist(self.h_energy, clsts.energy)
-        rnp.fill_hist(self.h_layer, clsts.layer)
-        rnp.fill_hist(self.h_layerVenergy, clsts[['layer', 'energy']])
+        bh.fill_1Dhist(self.h_energy, clsts.energy)
+        bh.fill_1Dhist(self.h_layer, clsts.layer)
+        bh.fill_2Dhist(self.h_layerVenergy, clsts.layer, clsts.energy)
         # if 'ncells' in clsts.columns:
-        rnp.fill_hist(self.h_ncells, clsts.ncells)
-        rnp.fill_hist(self.h_layerVncells, clsts[['layer', 'ncells']])
+        bh.fill_1Dhist(self.h_ncells, clsts.ncells)
+        bh.fill_2Dhist(self.h_layerVncells, clsts.layer, clsts.ncells)
         # if 'nCoreCells' in clsts.columns:
-        #     rnp.fill_hist(self.h_nCoreCells, clsts.nCoreCells)
-        #     rnp.fill_hist(self.h_layerVnCoreCells, clsts[['layer', 'nCoreCells']])
+        #     bh.fill_1Dhist(self.h_nCoreCells, clsts.nCoreCells)
+        #     bh.fill_2Dhist(self.h_layerVnCoreCells, clsts.layer, clsts.nCoreCells)
 
 
 
@@ -682,25 +721,25 @@ class TkEGHistos(BaseHistos):
         BaseHistos.__init__(self, name, root_file, debug)
 
     def fill(self, tkegs):
-        rnp.fill_hist(self.h_pt, tkegs.pt)
-        rnp.fill_hist(self.h_eta, tkegs.eta)
-        rnp.fill_hist(self.h_energy, tkegs.energy)
-        rnp.fill_hist(self.h_hwQual, tkegs.hwQual)
-        rnp.fill_hist(self.h_tkpt, tkegs.tkpt)
-        rnp.fill_hist(self.h_tketa, tkegs.tketa)
-        rnp.fill_hist(self.h_tkchi2, tkegs.tkchi2)
-        rnp.fill_hist(self.h_tkchi2Red, tkegs.tkchi2Red)
-        rnp.fill_hist(self.h_tknstubs, tkegs.tknstubs)
-        rnp.fill_hist(self.h_tkz0, tkegs.tkz0)
-        rnp.fill_hist(self.h_tkchi2RedVeta, tkegs[['eta', 'tkchi2Red']])
-        rnp.fill_hist(self.h_tknstubsVeta, tkegs[['eta', 'tknstubs']])
-        rnp.fill_hist(self.h_tkz0Veta, tkegs[['eta', 'tkz0']])
-        rnp.fill_hist(self.h_dphi, tkegs.dphi)
-        rnp.fill_hist(self.h_deta, tkegs.deta)
-        rnp.fill_hist(self.h_dphiVpt, tkegs[['pt', 'dphi']])
-        rnp.fill_hist(self.h_detaVpt, tkegs[['pt', 'deta']])
-        rnp.fill_hist(self.h_dr, tkegs.dr)
-        rnp.fill_hist(self.h_ptVtkpt, tkegs[['tkpt', 'pt']])
+        bh.fill_1Dhist(self.h_pt, tkegs.pt)
+        bh.fill_1Dhist(self.h_eta, tkegs.eta)
+        bh.fill_1Dhist(self.h_energy, tkegs.energy)
+        bh.fill_1Dhist(self.h_hwQual, tkegs.hwQual)
+        bh.fill_1Dhist(self.h_tkpt, tkegs.tkpt)
+        bh.fill_1Dhist(self.h_tketa, tkegs.tketa)
+        bh.fill_1Dhist(self.h_tkchi2, tkegs.tkchi2)
+        bh.fill_1Dhist(self.h_tkchi2Red, tkegs.tkchi2Red)
+        bh.fill_1Dhist(self.h_tknstubs, tkegs.tknstubs)
+        bh.fill_1Dhist(self.h_tkz0, tkegs.tkz0)
+        bh.fill_2Dhist(self.h_tkchi2RedVeta, tkegs.eta, tkegs.tkchi2Red)
+        bh.fill_2Dhist(self.h_tknstubsVeta, tkegs.eta, tkegs.tknstubs)
+        bh.fill_2Dhist(self.h_tkz0Veta, tkegs.eta, tkegs.tkz0)
+        bh.fill_1Dhist(self.h_dphi, tkegs.dphi)
+        bh.fill_1Dhist(self.h_deta, tkegs.deta)
+        bh.fill_2Dhist(self.h_dphiVpt, tkegs.pt, tkegs.dphi)
+        bh.fill_2Dhist(self.h_detaVpt, tkegs.pt, tkegs.deta)
+        bh.fill_1Dhist(self.h_dr, tkegs.dr)
+        bh.fill_2Dhist(self.h_ptVtkpt, tkegs.tkpt, tkegs.pt)
 
 
 class TrackHistos(BaseHistos):
@@ -775,23 +814,28 @@ class TriggerTowerHistos(BaseHistos):
         BaseHistos.__init__(self, name, root_file, debug)
 
     def fill(self, towers):
-        rnp.fill_hist(self.h_pt, towers.pt)
-        rnp.fill_hist(self.h_etEm, towers.etEm)
-        rnp.fill_hist(self.h_etHad, towers.etHad)
-        rnp.fill_hist(self.h_HoE, towers.HoE)
-        rnp.fill_hist(self.h_HoEVpt, towers[['pt', 'HoE']])
-        rnp.fill_hist(self.h_energy, towers.energy)
-        rnp.fill_hist(self.h_eta, towers.eta)
-        rnp.fill_hist(self.h_ieta, towers.iEta)
-        rnp.fill_hist(self.h_ptVeta, towers[['eta', 'pt']])
-        rnp.fill_hist(self.h_etVieta, towers[['iEta', 'pt']])
-        rnp.fill_hist(self.h_etEmVieta, towers[['iEta', 'etEm']])
-        rnp.fill_hist(self.h_etHadVieta, towers[['iEta', 'etHad']])
-        if not towers.empty:
-            self.h_sumEt.Fill(towers.momentum.sum().Pt())
-            central_towers = towers[(towers.iEta != 0) & (towers.iEta != 17)]
-            if not central_towers.empty:
-                self.h_sumEtCentral.Fill(central_towers.momentum.sum().Pt())
+        bh.fill_1Dhist(self.h_pt, towers.pt)
+        bh.fill_1Dhist(self.h_etEm, towers.etEm)
+        bh.fill_1Dhist(self.h_etHad, towers.etHad)
+        bh.fill_1Dhist(self.h_HoE, towers.HoE)
+        bh.fill_2Dhist(self.h_HoEVpt, towers.pt, towers.HoE)
+        bh.fill_1Dhist(self.h_energy, towers.energy)
+        bh.fill_1Dhist(self.h_eta, towers.eta)
+        bh.fill_1Dhist(self.h_ieta, towers.iEta)
+        bh.fill_2Dhist(self.h_ptVeta, towers.eta, towers.pt)
+        bh.fill_2Dhist(self.h_etVieta, towers.iEta, towers.pt)
+        bh.fill_2Dhist(self.h_etEmVieta, towers.iEta, towers.etEm)
+        bh.fill_2Dhist(self.h_etHadVieta, towers.iEta, towers.etHad)
+        # vector sum of the tower momenta: one entry per event with at least one tower
+        self.h_sumEt.fill(self.sum_pt(towers))
+        central_towers = towers[(towers.iEta != 0) & (towers.iEta != 17)]
+        self.h_sumEtCentral.fill(self.sum_pt(central_towers))
+
+    @staticmethod
+    def sum_pt(towers):
+        towers = towers[ak.num(towers.pt, axis=1) > 0]
+        return np.hypot(ak.sum(towers.pt*np.cos(towers.phi), axis=1),
+                        ak.sum(towers.pt*np.sin(towers.phi), axis=1)).to_numpy()
 
 
 class TriggerTowerResoHistos(BaseResoHistos):
@@ -867,11 +911,11 @@ class Reso2DHistos(BaseHistos):
             if 'x' in target.columns:
                 target['xres'] = reference.posx[target.layer-1]-target.x
                 # print target[['layer', 'xres']]
-                rnp.fill_hist(self.h_xResVlayer, target[['layer', 'xres']])
+                self.h_xResVlayer.fill(target.layer, target.xres)
             if 'y' in target.columns:
                 target['yres'] = reference.posy[target.layer-1]-target.y
                 # print target[['layer', 'yres']]
-                rnp.fill_hist(self.h_yResVlayer, target[['layer', 'yres']])
+                self.h_yResVlayer.fill(target.layer, target.yres)
             # print target[['layer', 'xres', 'yres']]
 
 
@@ -886,14 +930,14 @@ class GeomHistos(BaseHistos):
         BaseHistos.__init__(self, name, root_file, debug)
 
     def fill(self, tcs):
-        if True:
-            ee_tcs = tcs[tcs.subdet == 3]
-            for index, tc_geom in ee_tcs.iterrows():
-                self.h_maxNNDistVlayer.Fill(tc_geom.layer, np.max(tc_geom.neighbor_distance))
-                self.h_minNNDistVlayer.Fill(tc_geom.layer, np.min(tc_geom.neighbor_distance))
+        ee_tcs = tcs[tcs.subdet == 3]
+        # TCs w/o neighbors would give None for the min/max distance
+        nn_tcs = ee_tcs[ak.num(ee_tcs.neighbor_distance, axis=-1) > 0]
+        bh.fill_2Dhist(self.h_maxNNDistVlayer, nn_tcs.layer, ak.max(nn_tcs.neighbor_distance, axis=-1))
+        bh.fill_2Dhist(self.h_minNNDistVlayer, nn_tcs.layer, ak.min(nn_tcs.neighbor_distance, axis=-1))
 
-        rnp.fill_hist(self.h_nTCsPerLayer, tcs[tcs.subdet == 3].layer)
-        rnp.fill_hist(self.h_radiusVlayer, tcs[['layer', 'radius']])
+        bh.fill_1Dhist(self.h_nTCsPerLayer, ee_tcs.layer)
+        bh.fill_2Dhist(self.h_radiusVlayer, tcs.layer, tcs.radius)
 
 
 class DensityHistos(BaseHistos):
@@ -1392,7 +1436,7 @@ class TCClusterMatchHistos(BaseHistos):
         BaseHistos.__init__(self, name, root_file, debug)
 
     def fill(self, tcs, cluster):
-        rnp.fill_hist(self.h_dEtaVdPhi, tcs[['delta_phi', 'delta_eta']])
+        self.h_dEtaVdPhi.fill(tcs.delta_phi, tcs.delta_eta)
         # print tcs.dr
         # print tcs.delta_eta.std(), tcs.delta_phi.std(), tcs.dr.std()
 
@@ -1403,19 +1447,19 @@ class TCClusterMatchHistos(BaseHistos):
         self.h_dRhoRMSVenergy.Fill(cluster.energy, tcs.dr.std())
         self.h_dRhoRMSVpt.Fill(cluster.pt, tcs.dr.std())
 
-        rnp.fill_hist(self.h_dRho, tcs.dr)
-        rnp.fill_hist(self.h_dRho2, tcs.dr, tcs.ef)
-        rnp.fill_hist(self.h_dRhoVlayer, tcs[['layer', 'dr']])
-        rnp.fill_hist(self.h_dtVlayer2, tcs[['layer', 'dt']], tcs['ef'])
-        rnp.fill_hist(self.h_duVlayer2, tcs[['layer', 'du']], tcs['ef'])
+        self.h_dRho.fill(tcs.dr)
+        self.h_dRho2.fill(tcs.dr, weight=tcs.ef)
+        self.h_dRhoVlayer.fill(tcs.layer, tcs.dr)
+        self.h_dtVlayer2.fill(tcs.layer, tcs.dt, weight=tcs.ef)
+        self.h_duVlayer2.fill(tcs.layer, tcs.du, weight=tcs.ef)
 
-        rnp.fill_hist(self.h_dtVlayer, tcs[['layer', 'dt']])
-        rnp.fill_hist(self.h_duVlayer, tcs[['layer', 'du']])
+        self.h_dtVlayer.fill(tcs.layer, tcs.dt)
+        self.h_duVlayer.fill(tcs.layer, tcs.du)
 
-        rnp.fill_hist(self.h_dRhoVabseta, tcs[['abseta_cl', 'dr']])
-        # rnp.fill_hist(self.h_dRhoVfbrem, tcs[['fbrem_cl', 'dr']])
-        rnp.fill_hist(self.h_dtVdu, tcs[['dt', 'du']])
-        rnp.fill_hist(self.h_dtVdu2, tcs[['dt', 'du']], tcs['ef'])
+        self.h_dRhoVabseta.fill(tcs.abseta_cl, tcs.dr)
+        # self.h_dRhoVfbrem.fill(tcs.fbrem_cl, tcs.dr)
+        self.h_dtVdu.fill(tcs.dt, tcs.du)
+        self.h_dtVdu2.fill(tcs.dt, tcs.du, weight=tcs.ef)
         # self.h_fbremVabseta.Fill(cluster.abseta, cluster.fbrem)
 
 
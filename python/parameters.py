@@ -1,14 +1,55 @@
 import os
 import socket
+from dataclasses import dataclass, field
 
 from rich import print as pprint
 from rich.console import Console
 from rich.table import Table
 
 
-class Parameters(dict):
-    def __getattr__(self, name):
-        return self[name]
+@dataclass(slots=True)
+class Options:
+    # command line options
+    COLLECTION: str
+    SAMPLE: str
+    DEBUG: int
+    NEVENTS: int
+    BATCH: int
+    RUN: str
+    OUTDIR: str
+    LOCAL: bool
+    WORKERS: int
+    WORKDIR: str
+    SUBMIT: bool
+    CONFIGFILE: str
+    DATASETFILE: str
+
+
+@dataclass(slots=True)
+class Parameters:
+    # parameters of the processing of one sample
+    input_base_dir: str
+    input_sample_dir: str
+    tree_name: str
+    output_filename_base: str
+    output_filename: str
+    output_dir: str
+    clusterize: bool
+    version: str
+    calib_version: str
+    rate_pt_wps: str
+    maxEvents: int
+    events_per_job: int
+    computeDensity: bool
+    plotters: list
+    htc_jobflavor: str
+    htc_priority: int
+    weight_file: str
+    debug: int
+    name: str
+    eventsToDump: list = field(default_factory=list)
+    # set at submission time
+    nbatch_jobs: int = 0
 
     def __str__(self):
         return (
@@ -102,28 +143,25 @@ def get_collection_parameters(opt, cfgfile):
                 job_flavor = collection_data['htc_jobflavor']
             
             params = Parameters(
-                {
-                    'input_base_dir': cfgfile['dataset']['input_dir'],
-                    'input_sample_dir': cfgfile['samples'][sample]['input_sample_dir'],
-                    'tree_name': cfgfile['dataset']['tree_name'],
-                    'output_filename_base': output_filename_base,
-                    'output_filename': out_file,
-                    'output_dir': outdir,
-                    'clusterize': cfgfile['common']['run_clustering'],
-                    'eventsToDump': [],
-                    'version': plot_version,
-                    'calib_version': cfgfile['dataset']['calib_version'],
-                    'rate_pt_wps': rate_pt_wps,
-                    'maxEvents': int(opt.NEVENTS),
-                    'events_per_job': events_per_job,
-                    'computeDensity': cfgfile['common']['run_density_computation'],
-                    'plotters': plotters,
-                    'htc_jobflavor': job_flavor,
-                    'htc_priority': priority,
-                    'weight_file': weight_file,
-                    'debug': opt.DEBUG,
-                    'name': sample,
-                }
+                input_base_dir=cfgfile['dataset']['input_dir'],
+                input_sample_dir=cfgfile['samples'][sample]['input_sample_dir'],
+                tree_name=cfgfile['dataset']['tree_name'],
+                output_filename_base=output_filename_base,
+                output_filename=out_file,
+                output_dir=outdir,
+                clusterize=cfgfile['common']['run_clustering'],
+                version=plot_version,
+                calib_version=cfgfile['dataset']['calib_version'],
+                rate_pt_wps=rate_pt_wps,
+                maxEvents=int(opt.NEVENTS),
+                events_per_job=events_per_job,
+                computeDensity=cfgfile['common']['run_density_computation'],
+                plotters=plotters,
+                htc_jobflavor=job_flavor,
+                htc_priority=priority,
+                weight_file=weight_file,
+                debug=opt.DEBUG,
+                name=sample,
             )
             sample_params.append(params)
         collection_params[collection] = sample_params
@@ -47,6 +47,9 @@ class Test:
 
 
 class BasePlotter:
+    # plotters not yet ported to the batch processing need to be called once per event
+    fill_per_event = False
+
     def __init__(self, data_set, data_selections, gen_set=None, gen_selections=None):
         self.data_set = data_set
         self.data_selections = data_selections
@@ -87,6 +90,9 @@ class BasePlotter:
         if self.data_set.new_read:
             self.fill_histos(debug)
 
+    def fill_histos_batch(self, debug=0):
+        self.fill_histos(debug)
+
     def __repr__(self):
         return f'<{self.__class__.__name__}, ds: {self.data_set}, ds_sel: {self.data_selections}, g: {self.gen_set}, g_sel: {self.gen_selections} >'
     # def change_genpart_selection(self, newselection):
@@ -515,34 +521,25 @@ class GenericGenMatchPlotter(BasePlotter):
         # fill histo with all selected GEN particles before any match
         h_gen.fill(gen)
 
-        # perform the matching
-        match_eta = ak.cartesian([objects.eta, gen[self.gen_eta_phi_columns[0]]])
-        match_phi = ak.cartesian([objects.phi, gen[self.gen_eta_phi_columns[1]]])
-        match_pt = ak.cartesian([objects.pt, gen.pt])
-        match_idx = ak.argcartesian([objects.eta, gen.eta])
-
-        obj_eta, gen_eta = ak.unzip(match_eta)
-        obj_phi, gen_phi = ak.unzip(match_phi)
-        obj_pt, gen_pt = ak.unzip(match_pt)
-        obj_idx, gen_idx = ak.unzip(match_idx)
-        dpt = np.abs(obj_pt - gen_pt)
-        dr2 = (obj_eta-gen_eta)**2+(obj_phi-gen_phi)**2
-        match = ak.Array(data={'ele_idx': obj_idx, 'gen_idx': gen_idx, 'dpt': dpt, 'dr2': dr2})
-        dr_match=match[match.dr2<self.dr2]
-        for genid in np.unique(ak.flatten(dr_match.gen_idx)):
-            gen_match_id = dr_match[dr_match.gen_idx == genid]
-            dpt_min_index = ak.argmin(gen_match_id.dpt, axis=1, keepdims=True)
-            best_match_id = gen_match_id[dpt_min_index]
-            matched_obj = objects[best_match_id.ele_idx]
-            matched_gen = gen[best_match_id.gen_idx]
-            h_object_matched.fill(matched_obj)
-            if h_gen_matched is not None:
-                h_gen_matched.fill(matched_gen)
-            h_reso.fill(reference=matched_gen,
-                        target=matched_obj)
-            # FIXME: [AWKWARD]
-            # if hasattr(h_reso, 'fill_nMatch'):
-            #     h_reso.fill_nMatch(len(allmatches[idx]))
+        # perform the matching: for each GEN particle the object with the closest pT within the DR cut
+        best_match_idx = utils.match_best_dpt(objects.eta,
+                                              objects.phi,
+                                              objects.pt,
+                                              gen[self.gen_eta_phi_columns[0]],
+                                              gen[self.gen_eta_phi_columns[1]],
+                                              gen.pt,
+                                              self.dr2)
+        has_match = best_match_idx >= 0
+        matched_obj = objects[best_match_idx[has_match]]
+        matched_gen = gen[has_match]
+        h_object_matched.fill(matched_obj)
+        if h_gen_matched is not None:
+            h_gen_matched.fill(matched_gen)
+        h_reso.fill(reference=matched_gen,
+                    target=matched_obj)
+        # FIXME: [AWKWARD]
+        # if hasattr(h_reso, 'fill_nMatch'):
+        #     h_reso.fill_nMatch(len(allmatches[idx]))
 
 
     def book_histos(self):
@@ -1003,6 +1000,8 @@ class ClusterTCGenMatchPlotter(BasePlotter):
 
 
 class IsoTuplePlotter(BasePlotter):
+    fill_per_event = True
+
     def __init__(self,
                  data_set, gen_set,
                  data_selections=[selections.Selection('all')],
@@ -74,12 +74,20 @@ class TimeCounter:
             return flavor_time - time
         return None
 
+    def job_flavor_deadline(self, flavor, margin=0):
+        # time.monotonic() value at which the job slot ends (minus a safety margin)
+        if self.started():
+            return time.monotonic() + self.job_flavor_time_left(flavor) - margin
+        return None
+
+
+# job-wide counter: started by print_stats and used by the event loop to check the time left in the batch slot
+counter = TimeCounter()
+
 
 def print_stats(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        counter = TimeCounter()
-
         counter.start()
 
         nevents = 0
@@ -1,14 +1,24 @@
 import datetime
 import gc
 import resource
+from concurrent.futures import ThreadPoolExecutor
 
 import awkward as ak
+import numpy as np
 import vector
 
 vector.register_awkward()
 
+
+def is_double(branch):
+    # the detector quantities have (much) less than single precision: there is no point in reading them as float64
+    interpretation = branch.interpretation
+    interpretation = getattr(interpretation, 'content', interpretation)
+    return getattr(interpretation, 'to_dtype', None) == np.float64
+
+
 class TreeReader:
-    def __init__(self, entry_range, max_events):
+    def __init__(self, entry_range, max_events, n_threads=4):
         self.tree = None
         self._branches = []
         # this is the gloabl "entry" across files
@@ -17,6 +27,16 @@ class TreeReader:
         self.file_entry = -1
         self.max_events = max_events
         self.entry_range = entry_range
+        # # of entries in the current batch (starting at file_entry) when looping with next_batch
+        self.batch_entries = 0
+        # branches requested so far via getDataFrame: they are read in one go for each new batch
+        self.required_branches = set()
+        self._batch_arrays = None
+        # the thread pools reading the tree are created for each file by setTree and shut down by close
+        self.n_threads = n_threads
+        self._decompression_executor = None
+        self._prefetch_executor = None
+        self._prefetch = None
 
         self.n_tot_entries = 0
 
@@ -36,6 +56,21 @@ class TreeReader:
                             ]
         if len(self._branches) == 0:
             self._branches = [br for br in self.tree.keys() if br not in branch_blacklist]
+        # for the membership checks done at every batch
+        self._branch_names = set(self._branches)
+        # branches named <prefix>_<name> grouped by prefix: the names are split once per tree and not at every read
+        self._branches_by_prefix = {}
+        for br in self._branches:
+            prefix, _, name = br.partition('_')
+            if name:
+                self._branches_by_prefix.setdefault(prefix, {})[name] = br
+        # double precision branches: they are converted to float32 when read
+        self._double_branches = {br for br in self._branches if is_double(self.tree[br])}
+        # used both to decompress and to interpret the baskets of a batch
+        self._decompression_executor = ThreadPoolExecutor(max_workers=self.n_threads)
+        # the next batch is read in the background while the current one is processed
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=1)
+        self._prefetch = None
         print(f'open new tree file with # entries: {self.tree.num_entries}')
         self.file_entry = -1
 
@@ -68,6 +103,84 @@ class TreeReader:
         self.n_tot_entries += 1
         return True
 
+    def next_batch(self, batch_size, debug=0):
+        # move the cursor past the previous batch
+        if self.global_entry == -1:
+            self.global_entry = self.entry_range[0]
+            self.file_entry = self.entry_range[0]
+        else:
+            self.global_entry += self.batch_entries
+            # a new file was opened: the cursor starts again from 0
+            self.file_entry = 0 if self.file_entry == -1 else self.file_entry + self.batch_entries
+
+        limits = self.batch_limits(self.file_entry, self.global_entry, self.n_tot_entries, batch_size)
+        stop_reason = min(limits, key=limits.get)
+        self.batch_entries = max(limits[stop_reason], 0)
+        if self.batch_entries == 0:
+            print(f'END loop for {stop_reason}')
+            return False
+
+        # one print per batch: the batches are large enough to keep the log readable
+        self.printEntry()
+
+        self.n_tot_entries += self.batch_entries
+        self.read_batch(batch_size)
+        return True
+
+    def batch_limits(self, file_entry, global_entry, n_tot_entries, batch_size):
+        # max # of entries of a batch starting at file_entry for each of the possible stop conditions
+        limits = {'batch_size': batch_size, 'end_of_file': self.tree.num_entries - file_entry}
+        if self.entry_range[1] != -1:
+            limits['entry_range'] = 1 + self.entry_range[1] - global_entry
+        if self.max_events != -1:
+            limits['max_event'] = self.max_events - n_tot_entries
+        return limits
+
+    def read_arrays(self, branches, entry_start, entry_stop):
+        # the branches are selected with a set lookup: uproot checks the filter for every branch of the tree
+        arrays = self.tree.arrays(filter_name=frozenset(branches).__contains__,
+                                  library='ak',
+                                  entry_start=entry_start,
+                                  entry_stop=entry_stop,
+                                  decompression_executor=self._decompression_executor,
+                                  interpretation_executor=self._decompression_executor)
+        for br in self._double_branches.intersection(arrays.fields):
+            arrays[br] = ak.values_astype(arrays[br], np.float32)
+        return arrays
+
+    def read_batch(self, batch_size):
+        self._batch_arrays = None
+        branches = sorted(self.required_branches & self._branch_names)
+        if len(branches) == 0:
+            # the branches are discovered by getDataFrame while processing the first batch
+            return
+
+        entry_stop = self.file_entry + self.batch_entries
+        if self._prefetch is not None and self._prefetch[0] == (self.file_entry, entry_stop, branches):
+            self._batch_arrays = self._prefetch[1].result()
+        else:
+            self._batch_arrays = self.read_arrays(branches, self.file_entry, entry_stop)
+        self._prefetch = None
+
+        next_entries = max(min(self.batch_limits(entry_stop,
+                                                 self.global_entry + self.batch_entries,
+                                                 self.n_tot_entries,
+                                                 batch_size).values()), 0)
+        if next_entries > 0:
+            self._prefetch = (
+                (entry_stop, entry_stop + next_entries, branches),
+                self._prefetch_executor.submit(self.read_arrays, branches, entry_stop, entry_stop + next_entries))
+
+    def close(self):
+        # to be called before closing the file: no read can be left running on it
+        if self._prefetch is not None:
+            future = self._prefetch[1]
+            if not future.cancel() and future.exception() is not None:
+                print(f'WARNING: reading the next batch failed: {future.exception()!r}')
+            self._prefetch = None
+        self._prefetch_executor.shutdown()
+        self._decompression_executor.shutdown()
+
     def printEntry(self):
         print(f'--- File entry: {self.file_entry}, global entry: {self.global_entry}, tot # events: {self.n_tot_entries} @ {datetime.datetime.now()}, MaxRSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1000000.0:.2f} Mb')
         # print(self.tree.keys())
@@ -90,32 +203,30 @@ class TreeReader:
 
 
     def getDataFrame(self, prefix, entry_block, fallback=None):
-        branches = [br for br in self._branches
-                    if br.startswith(f'{prefix}_') and
-                    br != f'{prefix}_n']
-        names = ['_'.join(br.split('_')[1:]) for br in branches]
-        name_map = dict(zip(names, branches))
+        name_map = {name: br for name, br in self._branches_by_prefix.get(prefix, {}).items() if name != 'n'}
+        names = list(name_map.keys())
+        branches = list(name_map.values())
         if len(branches) == 0:
             if fallback is not None:
                 return self.getDataFrame(prefix=fallback, entry_block=entry_block)
-            prefs = set([br.split('_')[0] for br in self._branches])
+            prefs = set(self._branches_by_prefix.keys())
             print(f'stored branch prefixes are: {prefs}')
             raise ValueError(f'[TreeReader::getDataFrame] No branches with prefix: {prefix}')
 
-        akarray = self.tree.arrays(names,
-                                   library='ak',
-                                   aliases=name_map,
-                                   entry_start=self.file_entry,
-                                   entry_stop=self.file_entry+entry_block)
+        self.required_branches.update(branches)
+        if (self._batch_arrays is not None and
+                entry_block == self.batch_entries and
+                all(br in self._batch_arrays.fields for br in branches)):
+            records = {name: self._batch_arrays[br] for name, br in name_map.items()}
+        else:
+            akarray = self.read_arrays(branches, self.file_entry, self.file_entry+entry_block)
 
-        # print(akarray)
-        records = {}
-        for field in akarray.fields:
-            records[field] = akarray[field]
+            # print(akarray)
+            records = {name: akarray[br] for name, br in name_map.items()}
 
         if 'pt' in names and 'eta' in names and 'phi' in names:
             if 'mass' not in names and 'energy' not in names:
-                records['mass'] = 0.*akarray['pt']
+                records['mass'] = 0.*records['pt']
             return vector.zip(records)
 
         return ak.zip(records)
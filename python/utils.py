@@ -1,7 +1,9 @@
 import math as m
 
+import awkward as ak
 import numpy as np
 import pandas as pd
+from numba import njit, prange
 from scipy.spatial import cKDTree
 
 
@@ -64,6 +66,48 @@ def match_etaphi(ref_etaphi, trigger_etaphi, trigger_pt, deltaR=0.2, return_posi
     return best_match_indices, all_matches_indices
 
 
+# no fastmath: the DR cut and the pT comparison must give the same result as the numpy computation
+@njit(parallel=True, cache=True)
+def _best_match_kernel(obj_offsets, obj_eta, obj_phi, obj_pt, gen_offsets, gen_eta, gen_phi, gen_pt, dr2_max):
+    best_match = np.full(len(gen_pt), -1, dtype=np.int64)
+    for iev in prange(len(gen_offsets)-1):
+        for igen in range(gen_offsets[iev], gen_offsets[iev+1]):
+            best_dpt = 0.
+            for iobj in range(obj_offsets[iev], obj_offsets[iev+1]):
+                dr2 = (obj_eta[iobj]-gen_eta[igen])**2+(obj_phi[iobj]-gen_phi[igen])**2
+                if dr2 < dr2_max:
+                    dpt = abs(obj_pt[iobj]-gen_pt[igen])
+                    # the first object in the DR cut is taken as it is, then only strictly closer ones
+                    if best_match[igen] == -1 or dpt < best_dpt:
+                        best_dpt = dpt
+                        best_match[igen] = iobj-obj_offsets[iev]
+    return best_match
+
+
+def _flat_offsets(array):
+    return np.concatenate(([0], np.cumsum(ak.num(array, axis=1).to_numpy())))
+
+
+def match_best_dpt(obj_eta, obj_phi, obj_pt, gen_eta, gen_phi, gen_pt, dr2_max):
+    """
+    Match objects to the GEN particles of the same event within a given DeltaR^2.
+
+    Returns, for each GEN particle, the index in the event of the matched object
+    with the closest pT (-1 if none is found).
+    """
+    best_match = _best_match_kernel(
+        _flat_offsets(obj_pt),
+        ak.flatten(obj_eta).to_numpy(),
+        ak.flatten(obj_phi).to_numpy(),
+        ak.flatten(obj_pt).to_numpy(),
+        _flat_offsets(gen_pt),
+        ak.flatten(gen_eta).to_numpy(),
+        ak.flatten(gen_phi).to_numpy(),
+        ak.flatten(gen_pt).to_numpy(),
+        dr2_max)
+    return ak.unflatten(best_match, ak.num(gen_pt, axis=1))
+
+
 def debugPrintOut(level, name, toCount, toPrint, max_lines=-1):
     if level == 0:
         return
@@ -2,13 +2,13 @@ import logging
 import multiprocessing
 import optparse
 import os
+import subprocess
 import sys
 import time
 import traceback
 from shutil import copyfile
 
 import ROOT
-import subprocess32
 
 import python.file_manager as fm
 
@@ -105,7 +105,7 @@ def data_consumer(sample_name, version, queue_ready, queue_tomove):
         new_data.append(data)
         if(len(new_data) >= 20):
             logger.info(f'Launch hadd on {len(new_data)} files: ')
-            hadd_proc = subprocess32.Popen(['hadd', '-a', '-j', '2', '-k', out_file_name]+new_data, stdout=subprocess32.PIPE, stderr=subprocess32.STDOUT)
+            hadd_proc = subprocess.Popen(['hadd', '-a', '-j', '2', '-k', out_file_name]+new_data, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
             hadd_proc.wait()
             if hadd_proc.returncode == 0:
                 logger.info(f'   hadd succeeded with exit code: {hadd_proc.returncode}')
@@ -1,9 +1,8 @@
 import os
 import shutil
+import subprocess
 from concurrent import futures
 
-import subprocess32 as subprocess
-
 from python.main import main
 
 
@@ -0,0 +1,91 @@
+import awkward as ak
+import numpy as np
+
+from python.utils import match_best_dpt
+
+DR2_MAX = 0.1 * 0.1
+
+
+def match_best_dpt_cartesian(obj_eta, obj_phi, obj_pt, gen_eta, gen_phi, gen_pt, dr2_max):
+    # the matching as done in GenericGenMatchPlotter.plotObjectMatch before the numba kernel
+    obj_eta_c, gen_eta_c = ak.unzip(ak.cartesian([obj_eta, gen_eta]))
+    obj_phi_c, gen_phi_c = ak.unzip(ak.cartesian([obj_phi, gen_phi]))
+    obj_pt_c, gen_pt_c = ak.unzip(ak.cartesian([obj_pt, gen_pt]))
+    obj_idx, gen_idx = ak.unzip(ak.argcartesian([obj_eta, gen_eta]))
+    dpt = np.abs(obj_pt_c - gen_pt_c)
+    dr2 = (obj_eta_c-gen_eta_c)**2+(obj_phi_c-gen_phi_c)**2
+    match = ak.Array(data={'ele_idx': obj_idx, 'gen_idx': gen_idx, 'dpt': dpt, 'dr2': dr2})
+    dr_match = match[match.dr2 < dr2_max]
+
+    best_match = [[-1]*len(gens) for gens in gen_pt.tolist()]
+    for genid in np.unique(ak.to_numpy(ak.flatten(dr_match.gen_idx))):
+        gen_match_id = dr_match[dr_match.gen_idx == genid]
+        dpt_min_index = ak.argmin(gen_match_id.dpt, axis=1, keepdims=True)
+        best_match_id = gen_match_id[dpt_min_index]
+        for iev, ele_idx in enumerate(best_match_id.ele_idx.tolist()):
+            if len(ele_idx) > 0 and ele_idx[0] is not None:
+                best_match[iev][genid] = ele_idx[0]
+    return best_match
+
+
+def toy_sample():
+    # events: tie in pT, no objects, no GEN particles, nothing at all, no object within DR
+    objects = ak.Array([
+        {'eta': [0.10, 0.12, 0.08, 1.50], 'phi': [0.0, 0.02, -0.02, 1.0], 'pt': [8., 11., 11., 30.]},
+        {'eta': [], 'phi': [], 'pt': []},
+        {'eta': [0.5], 'phi': [0.5], 'pt': [20.]},
+        {'eta': [], 'phi': [], 'pt': []},
+        {'eta': [-1.0, 2.0], 'phi': [-1.0, 2.0], 'pt': [15., 25.]},
+    ])
+    gen = ak.Array([
+        {'eta': [0.1, 1.52], 'phi': [0.0, 1.01], 'pt': [10., 28.]},
+        {'eta': [0.3], 'phi': [0.3], 'pt': [10.]},
+        {'eta': [], 'phi': [], 'pt': []},
+        {'eta': [], 'phi': [], 'pt': []},
+        {'eta': [0.0], 'phi': [0.0], 'pt': [15.]},
+    ])
+    return objects, gen
+
+
+def random_sample(n_events=500, seed=42):
+    rng = np.random.default_rng(seed)
+    n_gen = rng.poisson(1.5, n_events)
+    n_obj = rng.poisson(3, n_events)
+    gen_eta = rng.uniform(-2.5, 2.5, n_gen.sum())
+    gen_phi = rng.uniform(-3., 3., n_gen.sum())
+    # objects close to a random GEN particle of the event (when there is one) to get several candidates
+    obj_eta = rng.uniform(-2.5, 2.5, n_obj.sum())
+    obj_phi = rng.uniform(-3., 3., n_obj.sum())
+    gen_offsets = np.concatenate(([0], np.cumsum(n_gen)))
+    obj_offsets = np.concatenate(([0], np.cumsum(n_obj)))
+    for iev in range(n_events):
+        if n_gen[iev] == 0:
+            continue
+        for iobj in range(obj_offsets[iev], obj_offsets[iev+1]):
+            igen = rng.integers(gen_offsets[iev], gen_offsets[iev+1])
+            obj_eta[iobj] = gen_eta[igen] + rng.normal(0, 0.05)
+            obj_phi[iobj] = gen_phi[igen] + rng.normal(0, 0.05)
+    # integer pTs: plenty of ties in |delta pT|
+    objects = ak.zip({'eta': ak.unflatten(obj_eta, n_obj),
+                      'phi': ak.unflatten(obj_phi, n_obj),
+                      'pt': ak.unflatten(rng.integers(5, 15, n_obj.sum()).astype(np.float64), n_obj)})
+    gen = ak.zip({'eta': ak.unflatten(gen_eta, n_gen),
+                  'phi': ak.unflatten(gen_phi, n_gen),
+                  'pt': ak.unflatten(rng.integers(5, 15, n_gen.sum()).astype(np.float64), n_gen)})
+    return objects, gen
+
+
+def run_both(objects, gen):
+    args = (objects.eta, objects.phi, objects.pt, gen.eta, gen.phi, gen.pt, DR2_MAX)
+    return match_best_dpt(*args).tolist(), match_best_dpt_cartesian(*args)
+
+
+def test_match_best_dpt_toy():
+    kernel, cartesian = run_both(*toy_sample())
+    assert kernel == [[1, 3], [-1], [], [], [-1]]
+    assert kernel == cartesian
+
+
+def test_match_best_dpt_random():
+    kernel, cartesian = run_both(*random_sample())
+    assert kernel == cartesian